@@ -7,6 +7,8 @@ import pandas as pd
 import requests
 import streamlit as st
 
+import single_flight
+
 # ======= Configuration =======
 API_KEY = st.secrets["GOOGLE_API_KEY"]       # Your Google API Key
 CSE_ID = st.secrets["CUSTOM_SEARCH_ENGINE_ID"]  # Your Custom Search Engine ID
@@ -23,7 +25,19 @@ def fetch_google_results(
     Supports paging up to 100 results (in batches of 10).
     extra_params: map of additional CSE API parameters (exactTerms, excludeTerms, fileType, siteSearch, lr, cr, dateRestrict)
     Returns list of dicts (title, link, date_scraped) and error message if any.
+    Concurrent identical searches share one set of API calls (see single_flight).
     """
+    return single_flight.run(
+        "cse",
+        {"q": query, "extra_params": extra_params or {}},
+        lambda: _fetch_google_results(query, extra_params),
+    )
+
+
+def _fetch_google_results(
+    query: str,
+    extra_params: Optional[Dict[str, str]] = None
+) -> Tuple[List[Dict], Optional[str]]:
     if not query:
         return [], "Search query cannot be empty"
     if not API_KEY:
@@ -14,6 +14,8 @@ import pandas as pd
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
 from playwright_stealth import stealth_sync
 
+import single_flight
+
 # --------------------------------
 # CONFIGURATION
 # --------------------------------
@@ -102,6 +104,15 @@ def fetch_page_results(context, url):
 # --------------------------------
 @st.cache_data(ttl=3600)
 def scrape_google_advanced(params: dict, pause: float = 0.5, max_pages: int = DEFAULT_MAX_PAGES):
+    # concurrent identical searches share one browser crawl
+    return single_flight.run(
+        "pw",
+        {"params": params, "max_pages": max_pages},
+        lambda: _scrape_google_advanced(params, pause, max_pages),
+    )
+
+
+def _scrape_google_advanced(params: dict, pause: float, max_pages: int):
     all_results = []
     playwright, browser, context = setup_browser(
         proxy=random.choice(PROXIES) if PROXIES else None,
@@ -13,6 +13,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
+import single_flight
+
 MAX_RETRIES = 3
 BACKOFF_BASE = 2  # sleep = BACKOFF_BASE ** retry
 
@@ -76,6 +78,15 @@ def fetch_one_page_url(driver, url):
 
 
 def scrape_google_advanced(params: dict, pause: float = 0.5):
+    # concurrent identical searches share one browser crawl
+    return single_flight.run(
+        "sel",
+        {"params": params},
+        lambda: _scrape_google_advanced(params, pause),
+    )
+
+
+def _scrape_google_advanced(params: dict, pause: float):
     driver = create_driver()
     all_results = []
     page_num = 0
@@ -0,0 +1,432 @@
+"""
+Single-flight coordination for identical concurrent searches.
+
+When several users (threads of one Streamlit server) or several worker
+processes ask for the same normalized query at the same time, only one of
+them actually runs the crawl / CSE request. Everyone else waits for it and
+receives the same result instead of launching another browser or spending
+more API quota.
+
+- Within a process: a per-key in-flight entry guarded by a threading lock.
+- Across processes: a per-key lock file (fcntl / msvcrt) plus a JSON result
+  file that the leader writes before releasing the lock.
+
+This is not a cache: a result is only shared with callers that were already
+waiting while it was being fetched, and leftover files are swept after
+RESULT_GRACE_PERIOD. Longer-lived caching is still done by
+``@st.cache_data`` in the scraper scripts.
+
+If the leader runs longer than SINGLEFLIGHT_WAIT_TIMEOUT, one waiter starts
+a backup fetch and every waiter takes whichever result arrives first, so a
+stuck crawl cannot block every user of a popular query and costs at most one
+extra fetch per timeout period.
+"""
+import copy
+import hashlib
+import json
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+if sys.platform.startswith("win"):
+    import msvcrt
+else:
+    import fcntl
+
+try:
+    import pandas as pd
+except ImportError:  # only needed to share DataFrame results
+    pd = None
+
+T = TypeVar("T")
+
+# ======= Configuration =======
+LOCK_DIR_ENV = "GOOGLE_SCRAPER_SINGLEFLIGHT_DIR"
+LOCK_POLL_INTERVAL = 0.2  # seconds between lock / result checks
+SINGLEFLIGHT_WAIT_TIMEOUT = 300  # seconds a waiter waits before replacing a stuck leader
+RESULT_GRACE_PERIOD = 60  # seconds a finished result stays on disk for waiters
+
+
+def _lock_dir() -> str:
+    """
+    Directory for lock and result files. Defaults to a per-user directory
+    in the system temp dir; override with GOOGLE_SCRAPER_SINGLEFLIGHT_DIR.
+    """
+    custom = os.environ.get(LOCK_DIR_ENV)
+    if custom:
+        return custom
+    suffix = f"-{os.getuid()}" if hasattr(os, "getuid") else ""
+    return os.path.join(tempfile.gettempdir(), f"google_scraper_singleflight{suffix}")
+
+
+# ======= Key Normalization =======
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items() if v not in (None, "")}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(namespace: str, params: Dict[str, Any]) -> str:
+    """
+    Build a stable key from a backend name and its search parameters.
+    Whitespace is collapsed and empty values are dropped, so trivially
+    different forms of the same search coalesce.
+    """
+    payload = json.dumps(
+        {"ns": namespace, "params": _normalize(params)},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ======= In-Process Coordination =======
+class _Flight:
+    def __init__(self):
+        self.generation = 0  # bumped each time a waiter takes over from a stuck leader
+        self.leader_started = time.time()
+        self.done = threading.Event()
+        self.result: Any = None
+        self.has_result = False
+        self.error: Optional[Exception] = None
+
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+# ======= Result Encoding =======
+def _encode_result(result: Any) -> str:
+    """
+    Serialize a scraper result to JSON: a list of dicts (Selenium),
+    a (results, error) tuple (CSE) or a DataFrame (Playwright).
+    """
+    if pd is not None and isinstance(result, pd.DataFrame):
+        payload = {
+            "kind": "dataframe",
+            "columns": [str(c) for c in result.columns],
+            "records": result.to_dict(orient="records"),
+        }
+    elif isinstance(result, tuple):
+        payload = {"kind": "tuple", "items": list(result)}
+    else:
+        payload = {"kind": "value", "value": result}
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _decode_result(text: str) -> Any:
+    payload = json.loads(text)
+    kind = payload["kind"]
+    if kind == "dataframe":
+        if pd is None:
+            raise ValueError("pandas is required to load a DataFrame result")
+        return pd.DataFrame(payload["records"], columns=payload["columns"])
+    if kind == "tuple":
+        return tuple(payload["items"])
+    return payload["value"]
+
+
+# ======= Cross-Process Coordination =======
+def _prepare_lock_dir() -> Optional[str]:
+    """
+    Create the lock directory and make sure nobody else can write to it.
+    Returns None (no cross-process sharing) if it is not a directory owned
+    by the current user without group/other write permission.
+    """
+    path = _lock_dir()
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError as err:
+        return _sharing_disabled(path, f"cannot create it ({err})")
+    if not stat.S_ISDIR(info.st_mode):
+        return _sharing_disabled(path, "it is not a directory")
+    if hasattr(os, "getuid"):
+        if info.st_uid != os.getuid():
+            return _sharing_disabled(path, "it is owned by another user")
+        if info.st_mode & 0o022:
+            return _sharing_disabled(path, "it is writable by group or others")
+    return path
+
+
+def _sharing_disabled(path: str, reason: str) -> None:
+    warnings.warn(
+        f"single_flight: not using {path} because {reason}; "
+        "identical searches in other processes will not be shared",
+        RuntimeWarning,
+    )
+    return None
+
+
+def _try_lock(fh) -> bool:
+    try:
+        if sys.platform.startswith("win"):
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock_file(fh) -> None:
+    if sys.platform.startswith("win"):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _same_file(fh, path: str) -> bool:
+    """
+    True if the open lock file is still the one at path; the sweep may have
+    unlinked it while we were waiting for it.
+    """
+    try:
+        opened, current = os.fstat(fh.fileno()), os.stat(path)
+    except OSError:
+        return False
+    return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+
+def _acquire_lock(lock_path: str, deadline: float, give_up: Optional[Callable[[], bool]] = None):
+    """
+    Open and lock lock_path, polling until deadline or until give_up() is true.
+    Returns the locked file object, or None if it gave up.
+    """
+    while True:
+        fh = open(lock_path, "a+b")
+        try:
+            while True:
+                if _try_lock(fh):
+                    if _same_file(fh, lock_path):
+                        return fh
+                    # locked a file the sweep already removed; reopen
+                    _unlock_file(fh)
+                    break
+                if time.time() >= deadline or (give_up is not None and give_up()):
+                    fh.close()
+                    return None
+                time.sleep(LOCK_POLL_INTERVAL)
+        except BaseException:
+            fh.close()
+            raise
+        fh.close()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _sweep(lock_dir: str) -> None:
+    """
+    Remove result files older than RESULT_GRACE_PERIOD and lock files
+    nobody holds, so finished searches leave nothing behind.
+    """
+    cutoff = time.time() - RESULT_GRACE_PERIOD
+    try:
+        names = os.listdir(lock_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(lock_dir, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except OSError:
+            continue
+        if name.endswith(".result") or name.endswith(".tmp"):
+            _remove(path)
+        elif name.endswith(".lock"):
+            try:
+                fh = open(path, "a+b")
+            except OSError:
+                continue
+            with fh:
+                if _try_lock(fh):
+                    # unlink while holding it; waiters on this file will reopen
+                    if _same_file(fh, path):
+                        _remove(path)
+                    _unlock_file(fh)
+
+
+def _is_fresh(path: str, since: float) -> bool:
+    try:
+        return os.path.getmtime(path) >= since
+    except OSError:
+        return False
+
+
+def _read_result(path: str, since: float) -> Optional[Dict[str, Any]]:
+    """
+    Return the result another process stored for this key, but only if it
+    was written after we started waiting (older files are stale).
+    """
+    try:
+        if not _is_fresh(path, since):
+            return None
+        with open(path, "r", encoding="utf-8") as fh:
+            return {"result": _decode_result(fh.read())}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_result(path: str, result: Any) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        text = _encode_result(result)
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        # sharing is best effort; waiters will simply fetch on their own
+        _remove(tmp_path)
+
+
+def _run_across_processes(key: str, fetch: Callable[[], T], generation: int = 0) -> T:
+    lock_dir = _prepare_lock_dir()
+    if lock_dir is None:
+        return fetch()
+    _sweep(lock_dir)
+
+    result_path = os.path.join(lock_dir, f"{key}.result")
+
+    started = time.time()
+    while True:
+        lock_path = os.path.join(lock_dir, f"{key}.{generation}.lock")
+        try:
+            lock_fh = _acquire_lock(
+                lock_path,
+                time.time() + SINGLEFLIGHT_WAIT_TIMEOUT,
+                lambda: _is_fresh(result_path, started),
+            )
+        except OSError:
+            # sharing is best effort; fetch on our own
+            return fetch()
+        if lock_fh is not None:
+            break
+        # a leader of any generation may have finished while we waited
+        shared = _read_result(result_path, started)
+        if shared is not None:
+            return shared["result"]
+        # the holder is stuck; waiters that timed out elect a new leader
+        # on the next generation's lock instead of each fetching
+        generation += 1
+    with lock_fh:
+        try:
+            # another process may have finished the same search while we waited
+            shared = _read_result(result_path, started)
+            if shared is not None:
+                return shared["result"]
+
+            _remove(result_path)
+            result = fetch()
+            _write_result(result_path, result)
+            return result
+        finally:
+            _unlock_file(lock_fh)
+
+
+# ======= Public API =======
+def run(namespace: str, params: Dict[str, Any], fetch: Callable[[], T]) -> T:
+    """
+    Run fetch() once for all concurrent callers with the same namespace and
+    normalized params, and return its result to every one of them.
+    Every caller gets its own copy of the result, so callers may modify it.
+    If fetch() raises, waiting threads in this process get the same error;
+    waiting processes fall back to running the fetch themselves.
+    If the leader runs longer than SINGLEFLIGHT_WAIT_TIMEOUT, one waiter
+    starts a new fetch; everyone gets whichever result arrives first.
+    """
+    key = make_key(namespace, params)
+
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                _flights[key] = flight
+
+        if leader:
+            return _lead(key, flight, 0, fetch)
+
+        while True:
+            remaining = flight.leader_started + SINGLEFLIGHT_WAIT_TIMEOUT - time.time()
+            if flight.done.wait(max(remaining, 0)):
+                break
+            with _flights_lock:
+                stuck = (
+                    not flight.done.is_set()
+                    and time.time() - flight.leader_started >= SINGLEFLIGHT_WAIT_TIMEOUT
+                )
+                if stuck:
+                    flight.generation += 1
+                    flight.leader_started = time.time()
+                    generation = flight.generation
+            if stuck:
+                # only this waiter takes over; the others keep waiting on the flight
+                return _lead(key, flight, generation, fetch)
+
+        if flight.error is not None:
+            raise flight.error
+        if flight.has_result:
+            return copy.deepcopy(flight.result)
+        # the leader was interrupted or its result could not be copied; start over
+
+
+def _lead(key: str, flight: _Flight, generation: int, fetch: Callable[[], T]) -> T:
+    try:
+        result = _run_across_processes(key, fetch, generation)
+    except Exception as err:
+        _finish(key, flight, error=err)
+        raise
+    except BaseException:
+        # KeyboardInterrupt / SystemExit stay in this thread; waiters start over
+        _finish(key, flight)
+        raise
+
+    try:
+        # keep a private copy so the leader's caller can't change it under waiters
+        shared = copy.deepcopy(result)
+    except Exception:
+        _finish(key, flight)  # waiters start over on their own
+    else:
+        _finish(key, flight, result=shared, has_result=True)
+    return result
+
+
+def _finish(
+    key: str,
+    flight: _Flight,
+    result: Any = None,
+    has_result: bool = False,
+    error: Optional[Exception] = None,
+) -> None:
+    """
+    Publish the outcome of the first leader to finish; later leaders of
+    the same flight just return their own result to their caller.
+    """
+    with _flights_lock:
+        if flight.done.is_set():
+            return
+        flight.result = result
+        flight.has_result = has_result
+        flight.error = error
+        if _flights.get(key) is flight:
+            del _flights[key]
+        flight.done.set()
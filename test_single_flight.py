@@ -0,0 +1,209 @@
+"""
+Tests for single_flight.py. Run with: python -m pytest test_single_flight.py
+(or python -m unittest test_single_flight).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import single_flight
+
+
+def _process_worker(lock_dir, counter_path, queue, wait_timeout=None):
+    os.environ[single_flight.LOCK_DIR_ENV] = lock_dir
+    if wait_timeout is not None:
+        single_flight.SINGLEFLIGHT_WAIT_TIMEOUT = wait_timeout
+
+    def fetch():
+        with open(counter_path, "a") as fh:
+            fh.write("x")
+        time.sleep(1)
+        return [{"title": "t", "url": "http://example.com", "pid": os.getpid()}]
+
+    queue.put(single_flight.run("test", {"q": "shared"}, fetch))
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.lock_dir = os.path.join(self.tmp, "flights")
+        env = mock.patch.dict(os.environ, {single_flight.LOCK_DIR_ENV: self.lock_dir})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def _run_threads(self, count, target):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def test_make_key_normalizes_params(self):
+        a = single_flight.make_key("cse", {"q": " python   scraper ", "lr": ""})
+        b = single_flight.make_key("cse", {"q": "python scraper"})
+        c = single_flight.make_key("pw", {"q": "python scraper"})
+        self.assertEqual(a, b)
+        self.assertNotEqual(b, c)
+
+    def test_threads_share_one_fetch(self):
+        calls, results = [], []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.5)
+            return [{"title": "t"}]
+
+        self._run_threads(5, lambda: results.append(single_flight.run("test", {"q": "a"}, fetch)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[{"title": "t"}]] * 5)
+        # every caller gets its own copy
+        self.assertEqual(len({id(r) for r in results}), 5)
+
+    def test_error_propagates_to_thread_waiters(self):
+        calls, errors = [], []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.5)
+            raise RuntimeError("blocked")
+
+        def target():
+            try:
+                single_flight.run("test", {"q": "err"}, fetch)
+            except RuntimeError as err:
+                errors.append(str(err))
+
+        self._run_threads(4, target)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, ["blocked"] * 4)
+
+    def test_timed_out_thread_waiters_elect_one_new_leader(self):
+        release = threading.Event()
+        calls, results = [], []
+
+        def fetch():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)  # the stuck leader
+                return "stuck"
+            time.sleep(0.1)  # well inside the wait timeout
+            return "fresh"
+
+        leader = threading.Thread(target=lambda: single_flight.run("test", {"q": "t"}, fetch))
+        leader.start()
+        time.sleep(0.1)
+        with mock.patch.object(single_flight, "SINGLEFLIGHT_WAIT_TIMEOUT", 0.3):
+            self._run_threads(6, lambda: results.append(single_flight.run("test", {"q": "t"}, fetch)))
+        release.set()
+        leader.join()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(results, ["fresh"] * 6)
+
+    def test_timed_out_process_waiters_elect_one_new_leader(self):
+        key = single_flight.make_key("test", {"q": "shared"})
+        os.makedirs(self.lock_dir, mode=0o700)
+        # a stuck leader holding the first lock
+        stuck = single_flight._acquire_lock(
+            os.path.join(self.lock_dir, f"{key}.0.lock"), time.time() + 1
+        )
+        self.addCleanup(stuck.close)
+
+        ctx = multiprocessing.get_context("spawn")
+        counter_path = os.path.join(self.tmp, "fetches")
+        queue = ctx.Queue()
+        procs = [
+            ctx.Process(target=_process_worker, args=(self.lock_dir, counter_path, queue, 2))
+            for _ in range(3)
+        ]
+        for p in procs:
+            p.start()
+        results = [queue.get(timeout=60) for _ in procs]
+        for p in procs:
+            p.join()
+
+        with open(counter_path) as fh:
+            self.assertEqual(len(fh.read()), 1)
+        self.assertEqual(len({r[0]["pid"] for r in results}), 1)
+
+    def test_uncopyable_result_is_not_an_error(self):
+        class Uncopyable(list):
+            def __deepcopy__(self, memo):
+                raise TypeError("no copies")
+
+        result = Uncopyable(["r"])
+        self.assertIs(single_flight.run("test", {"q": "copy"}, lambda: result), result)
+        self.assertEqual(single_flight._flights, {})
+
+    def test_lock_open_error_falls_back_to_fetch(self):
+        with mock.patch.object(single_flight, "_acquire_lock", side_effect=OSError("gone")):
+            self.assertEqual(single_flight.run("test", {"q": "gone"}, lambda: ["r"]), ["r"])
+
+    def test_processes_share_one_fetch(self):
+        ctx = multiprocessing.get_context("spawn")
+        counter_path = os.path.join(self.tmp, "fetches")
+        queue = ctx.Queue()
+        procs = [
+            ctx.Process(target=_process_worker, args=(self.lock_dir, counter_path, queue))
+            for _ in range(3)
+        ]
+        for p in procs:
+            p.start()
+        results = [queue.get(timeout=60) for _ in procs]
+        for p in procs:
+            p.join()
+
+        with open(counter_path) as fh:
+            self.assertEqual(len(fh.read()), 1)
+        self.assertEqual(len({r[0]["pid"] for r in results}), 1)
+
+    def test_tuple_result_round_trips(self):
+        value = ([{"title": "t", "link": "http://example.com"}], None)
+        self.assertEqual(single_flight._decode_result(single_flight._encode_result(value)), value)
+
+    def test_stale_result_is_ignored(self):
+        key = single_flight.make_key("test", {"q": "stale"})
+        os.makedirs(self.lock_dir, mode=0o700)
+        result_path = os.path.join(self.lock_dir, f"{key}.result")
+        single_flight._write_result(result_path, ["old"])
+        old = time.time() - 10
+        os.utime(result_path, (old, old))
+
+        self.assertIsNone(single_flight._read_result(result_path, time.time()))
+        self.assertEqual(single_flight.run("test", {"q": "stale"}, lambda: ["new"]), ["new"])
+
+    def test_sweep_removes_leftover_files(self):
+        single_flight.run("test", {"q": "sweep"}, lambda: ["r"])
+        self.assertTrue(os.listdir(self.lock_dir))
+
+        old = time.time() - single_flight.RESULT_GRACE_PERIOD - 10
+        for name in os.listdir(self.lock_dir):
+            os.utime(os.path.join(self.lock_dir, name), (old, old))
+        single_flight._sweep(self.lock_dir)
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIX permissions only")
+    def test_shared_lock_dir_is_not_used(self):
+        os.makedirs(self.lock_dir)
+        os.chmod(self.lock_dir, 0o777)
+        with self.assertWarns(RuntimeWarning):
+            self.assertIsNone(single_flight._prepare_lock_dir())
+
+        with self.assertWarns(RuntimeWarning):
+            self.assertEqual(single_flight.run("test", {"q": "open"}, lambda: ["r"]), ["r"])
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIX permissions only")
+    def test_readable_lock_dir_is_used(self):
+        os.makedirs(self.lock_dir)
+        os.chmod(self.lock_dir, 0o755)
+        self.assertEqual(single_flight._prepare_lock_dir(), self.lock_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()